@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# maze sizes in cells generated in addition to the shipped mazes
+DEFAULT_SIZES = "10,20,40,80"
+GENERATED_SEED = 1
+GENERATED_LOOPS = 0.05
+# number of random arguments the engine functions are called with
+ENGINE_SAMPLES = 1000
+# allowed relative drop in throughput before --baseline fails
+DEFAULT_THRESHOLD = 0.25
+# largest number of positions to analyse, the analysis is slow to trace
+ANALYSE_LIMIT = 1 << 20
+
+Result = Dict[str, Any]
+
+
+def loadModule(name: str, filename: str) -> ModuleType:
+    """
+    Loads a script that cannot be imported by name
+    """
+    spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+theseus = loadModule("theseus", "theseus-and-the-minotaur.py")
+generator = loadModule("generator", "generate-maze.py")
+
+
+def rate(
+    function: Callable[..., Any], arguments: Sequence[Tuple], minTime: float
+) -> float:
+    """
+    Calls the function with every argument tuple until minTime has passed
+
+    Returns the number of calls per second.
+    """
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while elapsed < minTime:
+        for args in arguments:
+            function(*args)
+        calls += len(arguments)
+        elapsed = time.perf_counter() - start
+    return calls / elapsed
+
+
+def benchmarkEngine(state: Any, minTime: float) -> Result:
+    """
+    Measures the coordinate based move functions in calls per second
+    """
+    rng = random.Random(0)
+    grid = state.grid
+    cells = grid.columns * grid.rows
+    coords = [
+        theseus.cellCoord(grid, rng.randrange(cells)) for _ in range(ENGINE_SAMPLES)
+    ]
+    moves = [rng.choice(theseus.SOLVER_MOVES) for _ in range(ENGINE_SAMPLES)]
+    maze = state.maze
+    return {
+        "movePlayer": rate(
+            theseus.movePlayer,
+            [(maze, coord, move) for (coord, move) in zip(coords, moves)],
+            minTime,
+        ),
+        "moveMinotaur": rate(
+            theseus.moveMinotaur,
+            [
+                (maze, player, minotaur)
+                for (player, minotaur) in zip(coords, coords[1:])
+            ],
+            minTime,
+        ),
+        "validMoves": rate(
+            theseus.validMoves, [(maze, coord) for coord in coords], minTime
+        ),
+    }
+
+
+def benchmarkStrategy(
+    filename: str, strategy: str, minTime: float, memory: bool
+) -> Result:
+    """
+    Solves the maze repeatedly for the solves per second and with memory once
+    more for the peak memory
+
+    The analysed strategy includes the time to build the outcome tables.
+    Tracing the allocations slows the solver down, so it is a separate run.
+    """
+    state = theseus.loadMaze(filename)
+    if strategy != "analysed":
+        state = state._replace(strategy=theseus.Strategy(strategy))
+
+    def run() -> Any:
+        theseus.solutionCache.solutions.clear()
+        analysed = theseus.analyseMaze(state) if strategy == "analysed" else state
+        return theseus.search(analysed)
+
+    solves = rate(run, [()], minTime)
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+    result = run()
+    if memory:
+        (_, peak) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "solvesPerSecond": solves,
+        "elapsed": 1 / solves,
+        "expanded": result.stats.expanded,
+        "expandedPerSecond": result.stats.expanded * solves,
+        "peakMemory": peak,
+        "moves": None if result.moves is None else len(result.moves),
+    }
+
+
+def benchmarkMaze(filename: str, minTime: float, memory: bool) -> Result:
+    """
+    Measures a maze once, with memory including the peak memory of the solvers
+    """
+    state = theseus.loadMaze(filename)
+    grid = state.grid
+    cells = grid.columns * grid.rows
+    strategies = [strategy.value for strategy in theseus.Strategy]
+    if cells * cells <= ANALYSE_LIMIT:
+        strategies.append("analysed")
+
+    return {
+        "cells": cells,
+        "loadsPerSecond": rate(theseus.loadMaze, [(filename,)], minTime),
+        "engine": benchmarkEngine(state, minTime),
+        "solve": {
+            strategy: benchmarkStrategy(filename, strategy, minTime, memory)
+            for strategy in strategies
+        },
+    }
+
+
+def fastest(first: Result, other: Result) -> Result:
+    """
+    Merges two measurements of the same maze keeping the higher rates
+    """
+    merged = dict(first)
+    merged["loadsPerSecond"] = max(first["loadsPerSecond"], other["loadsPerSecond"])
+    merged["engine"] = {
+        name: max(calls, other["engine"][name])
+        for (name, calls) in first["engine"].items()
+    }
+    merged["solve"] = {}
+    for (strategy, solve) in first["solve"].items():
+        solves = max(
+            solve["solvesPerSecond"], other["solve"][strategy]["solvesPerSecond"]
+        )
+        merged["solve"][strategy] = dict(
+            solve,
+            solvesPerSecond=solves,
+            elapsed=1 / solves,
+            expandedPerSecond=solve["expanded"] * solves,
+        )
+    return merged
+
+
+def generateMazes(sizes: List[int], directory: str) -> List[str]:
+    """
+    Writes a square generated maze of each size to the directory
+    """
+    filenames = []
+    for size in sizes:
+        maze = generator.generateMaze(size, size, GENERATED_LOOPS, GENERATED_SEED)
+        filename = os.path.join(directory, f"maze-{size}x{size}-{GENERATED_SEED}.txt")
+        with open(filename, "w") as f:
+            f.write("\n".join(maze) + "\n")
+        filenames.append(filename)
+    return filenames
+
+
+def runBenchmarks(args: argparse.Namespace) -> Result:
+    """
+    Measures every maze in rounds and keeps the fastest round of each rate
+
+    The rounds go over all the mazes in turn, so a while when other processes
+    slow the machine down only affects some of the rounds of a rate.
+    """
+    sizes = [int(size) for size in args.sizes.split(",") if size != ""]
+    results: Dict[str, Result] = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        filenames = sorted(glob.glob(args.mazes)) + generateMazes(sizes, directory)
+        for number in range(args.rounds):
+            for filename in filenames:
+                name = os.path.basename(filename)
+                result = benchmarkMaze(filename, args.min_time, number == 0)
+                if number > 0:
+                    result = fastest(results[name], result)
+                results[name] = result
+
+    for (name, result) in results.items():
+        solve = result["solve"]
+        print(
+            name,
+            " ".join(
+                f"{key}={value['elapsed']:.4f}s" for (key, value) in solve.items()
+            ),
+        )
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "mazes": results,
+    }
+
+
+def hotPaths(report: Result) -> Dict[str, float]:
+    """
+    Returns the throughput of the hot paths by name, higher is better
+    """
+    throughputs = {}
+    for (name, result) in report["mazes"].items():
+        throughputs[f"{name} moveMinotaur"] = result["engine"]["moveMinotaur"]
+        throughputs[f"{name} loadMaze"] = result["loadsPerSecond"]
+        for (strategy, solve) in result["solve"].items():
+            throughputs[f"{name} solve {strategy}"] = solve["solvesPerSecond"]
+    return throughputs
+
+
+def compareReports(baseline: Result, current: Result, threshold: float) -> List[str]:
+    """
+    Returns a line for every hot path slower than the baseline by more than
+    threshold, or missing from the current results
+    """
+    currentPaths = hotPaths(current)
+    regressions = []
+    for (path, before) in hotPaths(baseline).items():
+        if path not in currentPaths:
+            regressions.append(f"{path}: missing")
+            continue
+
+        ratio = currentPaths[path] / before
+        if ratio < 1 - threshold:
+            regressions.append(f"{path}: {ratio:.0%} of the baseline")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python3 benchmark.py",
+        description="Benchmarks the engine and the solvers of "
+        + "theseus-and-the-minotaur.py",
+    )
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help="comma separated sizes of the generated square mazes, in cells",
+    )
+    parser.add_argument(
+        "--mazes",
+        default=os.path.join(HERE, "maze*.txt"),
+        help="glob pattern of the maze files to benchmark",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.1,
+        help="seconds to call a benchmarked function for in each round",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=5,
+        help="number of rounds over all the mazes, the fastest round of each "
+        + "rate counts",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="FILE",
+        default="benchmark.json",
+        help="file to write the results to",
+    )
+    parser.add_argument(
+        "--input",
+        metavar="FILE",
+        default=None,
+        help="compare earlier results from FILE instead of running the benchmarks",
+    )
+    parser.add_argument(
+        "--baseline",
+        metavar="FILE",
+        default=None,
+        help="exit with an error if a hot path is slower than in the results in FILE",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="allowed relative drop in throughput compared to --baseline",
+    )
+    args = parser.parse_args()
+
+    if args.input is not None:
+        with open(args.input) as f:
+            report = json.load(f)
+    else:
+        report = runBenchmarks(args)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compareReports(baseline, report, args.threshold)
+        for line in regressions:
+            print(line)
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
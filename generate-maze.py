@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+
+from typing import List, Tuple
+import argparse
+import os
+import random
+import sys
+
+WALL = ord("#")
+WALKABLE = ord(".")
+EMPTY = ord(" ")
+PLAYER = ord("*")
+MINOTAUR = ord("M")
+FINISH = ord("X")
+
+# cell coordinate differences to the neighbours
+DIRECTIONS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+
+def generateMaze(width: int, height: int, loops: float, seed: int) -> List[str]:
+    """
+    Generates a maze of width * height cells
+
+    Cells are on odd coordinates with walls between them. The passages are a
+    randomized depth-first search, after which loops * cells walls are removed
+    to make more than one route. The finish is on the right edge, outside the
+    outer wall.
+    """
+    rng = random.Random(seed)
+    rows = [bytearray([WALL]) * (2 * width + 1) for _ in range(2 * height + 1)]
+    for y in range(height):
+        for x in range(width):
+            rows[2 * y + 1][2 * x + 1] = WALKABLE
+
+    visited = bytearray(width * height)
+    start = (rng.randrange(width), rng.randrange(height))
+    visited[start[1] * width + start[0]] = 1
+    stack: List[Tuple[int, int]] = [start]
+
+    while len(stack) > 0:
+        (x, y) = stack[-1]
+        neighbours = [
+            (x + dx, y + dy)
+            for (dx, dy) in DIRECTIONS
+            if 0 <= x + dx < width
+            and 0 <= y + dy < height
+            and not visited[(y + dy) * width + x + dx]
+        ]
+        if len(neighbours) == 0:
+            stack.pop()
+            continue
+
+        (newX, newY) = rng.choice(neighbours)
+        visited[newY * width + newX] = 1
+        rows[y + newY + 1][x + newX + 1] = EMPTY
+        stack.append((newX, newY))
+
+    # remove random inner walls between cells
+    for _ in range(int(loops * width * height)):
+        if rng.random() < 0.5 and width > 1:
+            (x, y) = (2 * rng.randrange(1, width), 2 * rng.randrange(height) + 1)
+        elif height > 1:
+            (x, y) = (2 * rng.randrange(width) + 1, 2 * rng.randrange(1, height))
+        else:
+            continue
+        rows[y][x] = EMPTY
+
+    cells = rng.sample(range(width * height), 2)
+    for (cell, char) in zip(cells, (PLAYER, MINOTAUR)):
+        (y, x) = divmod(cell, width)
+        rows[2 * y + 1][2 * x + 1] = char
+
+    finishY = 2 * rng.randrange(height) + 1
+    rows[finishY][2 * width] = EMPTY
+    rows[finishY].append(FINISH)
+
+    return [row.decode() for row in rows]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python3 generate-maze.py",
+        description="Generates mazes for theseus-and-the-minotaur.py",
+    )
+    parser.add_argument("width", type=int, help="number of cells horizontally")
+    parser.add_argument("height", type=int, help="number of cells vertically")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument(
+        "--loops",
+        type=float,
+        default=0.05,
+        help="extra walls to remove per cell, 0 makes a maze with a single route",
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=None,
+        help="write this many mazes with consecutive seeds to --output",
+    )
+    parser.add_argument(
+        "--output",
+        metavar="DIR",
+        default=".",
+        help="directory for the mazes with --count",
+    )
+    args = parser.parse_args()
+
+    if args.width < 1 or args.height < 1:
+        parser.error("width and height must be at least 1")
+    if args.width * args.height < 2:
+        parser.error("a maze needs at least 2 cells")
+
+    if args.count is None:
+        maze = generateMaze(args.width, args.height, args.loops, args.seed)
+        sys.stdout.write("\n".join(maze) + "\n")
+        return
+
+    os.makedirs(args.output, exist_ok=True)
+    for seed in range(args.seed, args.seed + args.count):
+        maze = generateMaze(args.width, args.height, args.loops, seed)
+        filename = f"maze-{args.width}x{args.height}-{seed}.txt"
+        with open(os.path.join(args.output, filename), "w") as f:
+            f.write("\n".join(maze) + "\n")
+
+
+if __name__ == "__main__":
+    main()
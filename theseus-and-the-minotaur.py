@@ -1,10 +1,38 @@
 #!/usr/bin/env python3
 
-from typing import List, Tuple, NamedTuple, Dict, Set
-from getch import getch  # type: ignore
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 from enum import Enum
+from collections import deque, OrderedDict
+from array import array
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import atexit
+import cProfile
+import glob
+import hashlib
+import heapq
+import json
+import mmap
+import os
+import pstats
+import shutil
+import struct
 import sys
-import random
+import time
 
 
 class MazeTile(Enum):
@@ -16,6 +44,8 @@ class MazeTile(Enum):
 
 PLAYER = "*"
 MINOTAUR = "M"
+PLAYER_TILE = f"\033[97;1m{PLAYER}\033[0m"
+MINOTAUR_TILE = f"\033[31;1m{MINOTAUR}\033[0m"
 
 Maze = List[List[MazeTile]]
 
@@ -35,59 +65,273 @@ class Move(Enum):
     AUTO = "a"
 
 
-UncheckedMoves = Set[Move]
+# moves the solver tries from every position, in this order
+SOLVER_MOVES = (Move.UP, Move.DOWN, Move.LEFT, Move.RIGHT, Move.SKIP)
+
+# bit of each direction in the open direction mask of a cell
+OPENINGS: Dict[Move, int] = {Move.UP: 1, Move.DOWN: 2, Move.LEFT: 4, Move.RIGHT: 8}
+
+Cell = int
+# game state encoded as player cell * cells + minotaur cell
+Position = int
+
+# array of cell ids
+CellTable = Sequence[int]
+
+# largest number of (player, minotaur) cell pairs that get a precomputed
+# minotaur transition, bigger mazes fall back to the single step table
+MINOTAUR_TABLE_LIMIT = 1 << 22
+
+# largest number of positions that can be analysed, the analysis keeps a few
+# 32-bit integers per position
+ANALYSE_LIMIT = 1 << 23
+
+# largest number of positions the solvers keep flags and parents for in arrays,
+# the searches of bigger mazes reach too few positions to pay for zeroing them
+# and only store the positions they reach
+POSITION_TABLE_LIMIT = 1 << 16
+
+# binary layout of cached tables: magic, version, the grid origin and size and
+# the lengths of the tables in cachedTables() order, followed by the tables as
+# native 32-bit integers and the grid openings, one byte per cell
+CACHE_HEADER = struct.Struct("=4sI4Q6Q")
+CACHE_MAGIC = b"TMTB"
+CACHE_VERSION = 2
+
+# number of solutions kept in memory
+SOLUTION_CACHE_SIZE = 4096
+
+# outcome table values besides the number of moves to a win
+POSITION_LOST = -1
+POSITION_DRAW = -2
+
+
+class Grid(NamedTuple):
+    """
+    Logical cells of a maze
+
+    Cells are the coordinates with the same parity as the player's starting
+    location and they are numbered row by row starting from the top left.
+    Each cell has a mask of OPENINGS bits for the directions it can be left to.
+    """
+
+    x: int
+    y: int
+    columns: int
+    rows: int
+    openings: CellTable
+
+
+class MinotaurIndex(NamedTuple):
+    """
+    Minotaur transitions in reverse
+
+    The minotaur cells that move to cell m when the player is on cell p are
+    minotaurs[starts[p * cells + m] : starts[p * cells + m + 1]].
+    """
+
+    starts: CellTable
+    minotaurs: CellTable
 
 
 class Turn(NamedTuple):
     player: Player
     minotaur: Minotaur
-    moves: List[Move]
+    # move that led to this turn, None for the starting turn
+    move: Optional[Move]
+
+
+class Strategy(Enum):
+    BFS = "bfs"
+    ASTAR = "astar"
 
 
 class State(NamedTuple):
     maze: Maze
     finish: Coord
-    initial: List[Move]
+    initial: Deque[Move]
     turns: List[Turn]
-    traversed: Dict[Tuple[Player, Minotaur], UncheckedMoves]
     solver: bool
-
-
-def loadMaze(filename: str) -> State:
+    strategy: Strategy
+    grid: Grid
+    # minotaur cell after a single step, indexed by cell * 9 + direction class
+    minotaurSteps: CellTable
+    # minotaur cell after both steps, indexed by player cell * cells + minotaur
+    # cell, empty if the maze is larger than MINOTAUR_TABLE_LIMIT
+    minotaurTable: CellTable
+    # number of player moves from each cell to the finish ignoring the
+    # minotaur, -1 if the finish cannot be reached
+    distances: CellTable
+    # moves to a win, POSITION_LOST or POSITION_DRAW indexed by position, empty
+    # until the maze is analysed
+    outcomes: CellTable
+    # empty until the maze is analysed
+    minotaurIndex: MinotaurIndex
+    # sha256 of the maze file
+    digest: str
+    # directory of cached tables or None to not cache them
+    cacheDir: Optional[str]
+    # colorized tiles of the maze without the player and the minotaur
+    layer: List[List[str]]
+    # the same joined into rows
+    layerRows: List[str]
+    # draws the current turn
+    render: Callable[["State"], None]
+
+
+# draws the current turn of a game
+Renderer = Callable[[State], None]
+
+
+class Result(Enum):
+    WON = "won"
+    LOST = "lost"
+    UNFINISHED = "unfinished"
+
+
+class Outcome(NamedTuple):
+    result: Result
+    turns: int
+
+
+class SearchStats(NamedTuple):
+    # number of positions expanded
+    expanded: int = 0
+    # moves to positions that had already been reached
+    duplicates: int = 0
+    # expanded positions that led to no new position, dead ends
+    backtracks: int = 0
+    # largest number of positions waiting to be expanded
+    frontierPeak: int = 0
+
+
+class Search(NamedTuple):
+    # shortest winning moves or None if there is no solution
+    moves: Optional[List[Move]]
+    stats: SearchStats
+
+
+# maze file hash, player and minotaur coordinates
+SolutionKey = Tuple[str, Coord, Coord]
+
+
+class SolveResult(NamedTuple):
+    filename: str
+    # None if the maze could not be loaded
+    key: Optional[SolutionKey]
+    moves: Optional[List[Move]]
+    stats: SearchStats
+    # seconds spent building the tables of the maze
+    tableTime: float
+    elapsed: float
+    # whether the solution came from the solution cache
+    cached: bool
+    # why the maze could not be solved, None on success
+    error: Optional[str] = None
+
+
+class Stats:
     """
-    Loads a maze from a file.
+    Solver counters summed over the searches of the process
 
-    Replace player and minotaur with WALKABLE tiles.
+    Searches answered from the solution cache are not counted, see the hits of
+    the cache instead.
     """
-    maze: Maze = []
-    player: Player = (0, 0)
-    minotaur: Minotaur = (0, 0)
-    finish: Coord = (0, 0)
 
-    with open(filename) as f:
-        for (y, line) in enumerate(f):
-            maze.append([])
-            for (x, char) in enumerate(line.strip()):
-                if char == PLAYER:
-                    player = (x, y)
-                    tile = MazeTile.WALKABLE
-                elif char == MINOTAUR:
-                    minotaur = (x, y)
-                    tile = MazeTile.WALKABLE
-                elif char == MazeTile.FINISH.value:
-                    finish = (x, y)
-                    tile = MazeTile.EMPTY
-                else:
-                    # this will raise an error if the character is not valid
-                    tile = MazeTile(char)
+    def __init__(self) -> None:
+        self.searches = 0
+        self.expanded = 0
+        self.duplicates = 0
+        self.backtracks = 0
+        self.frontierPeak = 0
+        # seconds spent building the tables of loaded and analysed mazes
+        self.tableTime = 0.0
+
+    def add(self, search: SearchStats) -> None:
+        self.searches += 1
+        self.expanded += search.expanded
+        self.duplicates += search.duplicates
+        self.backtracks += search.backtracks
+        self.frontierPeak = max(self.frontierPeak, search.frontierPeak)
+
+    def save(self, filename: str) -> None:
+        """
+        Writes the counters and the solution cache hits as JSON, - for stderr
+        """
+        counters = dict(
+            vars(self), hits=solutionCache.hits, misses=solutionCache.misses
+        )
+        if filename == "-":
+            print(json.dumps(counters), file=sys.stderr)
+            return
+
+        with open(filename, "w") as f:
+            json.dump(counters, f)
 
-                maze[y].append(tile)
 
-    moves: UncheckedMoves = validMoves(maze, player)
-    subState = Turn(player, minotaur, [])
-    traversed = {(player, minotaur): moves}
+class SolutionCache:
+    """
+    Least recently used cache of solutions
+
+    Unsolvable positions are cached too, as None. Counts hits and misses.
+    """
 
-    return State(maze, finish, [], [subState], traversed, False)
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # least recently used first
+        self.solutions: "OrderedDict[SolutionKey, Optional[List[Move]]]"
+        self.solutions = OrderedDict()
+
+    def get(self, key: SolutionKey) -> Optional[Search]:
+        """
+        Returns the cached solution as a search that expanded nothing
+        """
+        if key not in self.solutions:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.solutions.move_to_end(key)
+        moves = self.solutions[key]
+        return Search(None if moves is None else list(moves), SearchStats())
+
+    def put(self, key: SolutionKey, moves: Optional[List[Move]]) -> None:
+        """
+        Caches a copy of the solution, so that the caller may change theirs
+        """
+        self.solutions[key] = None if moves is None else list(moves)
+        self.solutions.move_to_end(key)
+        while len(self.solutions) > self.maxsize:
+            self.solutions.popitem(last=False)
+
+    def load(self, filename: str) -> None:
+        """
+        Adds the solutions saved in a JSON file, if it exists
+        """
+        if not os.path.isfile(filename):
+            return
+
+        with open(filename) as f:
+            for (digest, player, minotaur, moves) in json.load(f):
+                key = (digest, (player[0], player[1]), (minotaur[0], minotaur[1]))
+                self.put(key, None if moves is None else list(parseMoves(moves)))
+
+    def save(self, filename: str) -> None:
+        """
+        Writes the cached solutions to a JSON file, least recently used first
+        """
+        solutions = [
+            [digest, player, minotaur, None if moves is None else formatMoves(moves)]
+            for ((digest, player, minotaur), moves) in self.solutions.items()
+        ]
+        with open(filename, "w") as f:
+            json.dump(solutions, f)
+
+
+solutionCache = SolutionCache(SOLUTION_CACHE_SIZE)
+stats = Stats()
 
 
 def colorizeTile(tile: MazeTile) -> str:
@@ -100,27 +344,414 @@ def colorizeTile(tile: MazeTile) -> str:
         return tile.value
 
 
+# tile of every character of a maze file, the player and the minotaur stand on
+# walkable tiles and the finish is outside the maze
+LOAD_TILES = {
+    **{tile.value: tile for tile in MazeTile},
+    PLAYER: MazeTile.WALKABLE,
+    MINOTAUR: MazeTile.WALKABLE,
+    MazeTile.FINISH.value: MazeTile.EMPTY,
+}
+# the same colorized, looked up by character because hashing tiles is slow
+LOAD_COLORS = {char: colorizeTile(tile) for (char, tile) in LOAD_TILES.items()}
+# str.translate table that deletes the valid characters
+VALID_CHARS = str.maketrans("", "", "".join(LOAD_TILES))
+
+
+def loadMaze(filename: str, cacheDir: Optional[str] = None) -> State:
+    """
+    Loads a maze from a file.
+
+    Replace player and minotaur with WALKABLE tiles. With a cache directory the
+    tables are memory mapped from there if the same maze has been loaded
+    before.
+
+    Raises ValueError if the player, the minotaur or the finish is missing, or
+    if the minotaur or the finish is not on a cell the player can move to.
+    """
+    maze: Maze = []
+    player: Optional[Player] = None
+    minotaur: Optional[Minotaur] = None
+    finish: Optional[Coord] = None
+
+    with open(filename, "rb") as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+
+    layer: List[List[str]] = []
+    for (y, line) in enumerate(data.decode().splitlines()):
+        line = line.strip()
+        invalid = line.translate(VALID_CHARS)
+        if len(invalid) > 0:
+            # this will raise an error if the character is not valid
+            MazeTile(invalid[0])
+
+        # the last one counts if there are many
+        if PLAYER in line:
+            player = (line.rfind(PLAYER), y)
+        if MINOTAUR in line:
+            minotaur = (line.rfind(MINOTAUR), y)
+        if MazeTile.FINISH.value in line:
+            finish = (line.rfind(MazeTile.FINISH.value), y)
+
+        maze.append(list(map(LOAD_TILES.__getitem__, line)))
+        layer.append(list(map(LOAD_COLORS.__getitem__, line)))
+
+    for (name, coord) in (
+        ("player", player),
+        ("minotaur", minotaur),
+        ("finish", finish),
+    ):
+        if coord is None:
+            raise ValueError(f"maze has no {name}")
+    assert player is not None and minotaur is not None and finish is not None
+    # the player moves two tiles at a time, so other coordinates alias its cells
+    for (name, coord) in (("minotaur", minotaur), ("finish", finish)):
+        if (coord[0] - player[0]) % 2 != 0 or (coord[1] - player[1]) % 2 != 0:
+            raise ValueError(f"{name} at {coord} is not on a cell of the player")
+
+    subState = Turn(player, minotaur, None)
+    state = State(
+        maze=maze,
+        finish=finish,
+        initial=deque(),
+        turns=[subState],
+        solver=False,
+        strategy=Strategy.BFS,
+        grid=Grid(0, 0, 0, 0, bytearray()),
+        minotaurSteps=array("i"),
+        minotaurTable=array("i"),
+        distances=array("i"),
+        outcomes=array("i"),
+        minotaurIndex=MinotaurIndex(array("i"), array("i")),
+        digest=digest,
+        cacheDir=cacheDir,
+        layer=layer,
+        layerRows=["".join(row) for row in layer],
+        render=printMaze,
+    )
+
+    start = time.perf_counter()
+    cached = loadTables(state)
+    if cached is not None:
+        stats.tableTime += time.perf_counter() - start
+        return cached
+
+    grid = compileGrid(maze, player)
+    minotaurSteps = buildMinotaurSteps(grid)
+    state = state._replace(
+        grid=grid,
+        minotaurSteps=minotaurSteps,
+        minotaurTable=buildMinotaurTable(grid, minotaurSteps),
+        distances=buildDistances(grid, cellId(grid, finish)),
+    )
+    stats.tableTime += time.perf_counter() - start
+    saveTables(state)
+
+    return state
+
+
+def cachedTables(state: State) -> List[CellTable]:
+    """
+    Tables that are stored in the cache, in the order of the cache file
+    """
+    return [
+        state.minotaurSteps,
+        state.minotaurTable,
+        state.distances,
+        state.outcomes,
+        state.minotaurIndex.starts,
+        state.minotaurIndex.minotaurs,
+    ]
+
+
+def cachePath(state: State) -> str:
+    return os.path.join(state.cacheDir or "", state.digest + ".bin")
+
+
+def saveTables(state: State) -> None:
+    """
+    Writes the grid and the tables of a maze to the cache directory
+    """
+    if state.cacheDir is None:
+        return
+
+    (x, y, columns, rows, openings) = state.grid
+    tables = cachedTables(state)
+    os.makedirs(state.cacheDir, exist_ok=True)
+    path = cachePath(state)
+    # write to a temporary file so that readers never see a partial file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        lengths = [len(table) for table in tables]
+        f.write(
+            CACHE_HEADER.pack(CACHE_MAGIC, CACHE_VERSION, x, y, columns, rows, *lengths)
+        )
+        for table in tables:
+            f.write(memoryview(table).cast("B"))  # type: ignore
+        f.write(bytes(openings))
+    os.replace(temporary, path)
+
+
+def loadTables(state: State) -> Optional[State]:
+    """
+    Memory maps the cached grid and tables of a maze
+
+    The grid comes from the cache too, so a maze loaded before is not compiled
+    again. Returns None if the maze is not cached or the cache file does not
+    match.
+    """
+    if state.cacheDir is None or not os.path.isfile(cachePath(state)):
+        return None
+
+    with open(cachePath(state), "rb") as f:
+        if os.fstat(f.fileno()).st_size < CACHE_HEADER.size:
+            return None
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    (magic, version, x, y, columns, rows, *lengths) = CACHE_HEADER.unpack_from(mapped)
+    if magic != CACHE_MAGIC or version != CACHE_VERSION:
+        return None
+    cells = columns * rows
+    if CACHE_HEADER.size + 4 * sum(lengths) + cells != len(mapped):
+        return None
+    player = state.turns[-1].player
+    if (x, y) != (player[0] % 2, player[1] % 2):
+        return None
+
+    expected = [
+        (cells * 9,),
+        (0, cells * cells),
+        (cells,),
+        (0, cells * cells),
+        (0, cells * cells + 1),
+        (0, cells * cells),
+    ]
+    if any(length not in valid for (length, valid) in zip(lengths, expected)):
+        return None
+
+    tables: List[CellTable] = []
+    offset = CACHE_HEADER.size
+    data = memoryview(mapped)
+    for length in lengths:
+        tables.append(data[offset : offset + 4 * length].cast("i"))
+        offset += 4 * length
+    grid = Grid(x, y, columns, rows, data[offset : offset + cells])
+
+    return state._replace(
+        grid=grid,
+        minotaurSteps=tables[0],
+        minotaurTable=tables[1],
+        distances=tables[2],
+        outcomes=tables[3],
+        minotaurIndex=MinotaurIndex(tables[4], tables[5]),
+    )
+
+
 def printMaze(state: State) -> None:
     """
     Prints the maze with the player and minotaur
+
+    Only the rows with the player and minotaur are built, the rest come from
+    the colorized layer as is. Everything is written at once.
     """
-    printedMaze = [[colorizeTile(x) for x in xs] for xs in state.maze]
     subState = state.turns[-1]
-    player = subState.player
-    minotaur = subState.minotaur
-    printedMaze[player[1]][player[0]] = f"\033[97;1m{PLAYER}\033[0m"
-    printedMaze[minotaur[1]][minotaur[0]] = f"\033[31;1m{MINOTAUR}\033[0m"
+    rows = list(state.layerRows)
+    actorRows: Dict[int, List[str]] = {}
+    for ((x, y), tile) in (
+        (subState.player, PLAYER_TILE),
+        (subState.minotaur, MINOTAUR_TILE),
+    ):
+        actorRows.setdefault(y, list(state.layer[y]))[x] = tile
+    for (y, tiles) in actorRows.items():
+        rows[y] = "".join(tiles)
+
+    lines = rows + [line for line in statusLines(state) if line != ""]
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+def windowStart(center: int, size: int, total: int) -> int:
+    """
+    First index of a window of the given size centered around a location
+    """
+    return max(0, min(center - size // 2, total - size))
+
+
+def printViewport(state: State) -> None:
+    """
+    Prints the part of the maze around the player that fits the terminal
+
+    The window follows the player and is redrawn from the top left corner of
+    the terminal, so the cost of a frame depends on the size of the terminal,
+    not the maze.
+    """
+    (width, height) = shutil.get_terminal_size()
+    # leave room for the moves, the status and the input line
+    height = max(1, height - 3)
+    subState = state.turns[-1]
+    (playerX, playerY) = subState.player
+
+    top = windowStart(playerY, height, len(state.layer))
+    bottom = min(top + height, len(state.layer))
+    mazeWidth = max(len(state.layer[y]) for y in range(top, bottom))
+    left = windowStart(playerX, width, mazeWidth)
+
+    rows: List[str] = []
+    for y in range(top, bottom):
+        tiles = state.layer[y][left : left + width]
+        for ((x, actorY), tile) in (
+            (subState.player, PLAYER_TILE),
+            (subState.minotaur, MINOTAUR_TILE),
+        ):
+            if actorY == y and left <= x < left + len(tiles):
+                tiles[x - left] = tile
+        rows.append("".join(tiles) + "\033[K")
+
+    # only the latest moves fit on the line
+    recent = [turn.move for turn in state.turns[-width:] if turn.move is not None]
+    lines = rows + [
+        movesLine(recent, width) + "\033[K",
+        resultMessage(state)[:width] + "\033[K",
+    ]
+    sys.stdout.write("\033[H" + "\n".join(lines) + "\n\033[J")
+    sys.stdout.flush()
+
+
+def movesLine(moves: Sequence[Move], width: int) -> str:
+    """
+    Status line of the moves that fits on one terminal row of the width
+
+    The start of a long history is left out, the latest moves are shown.
+    """
+    line = "Moves: " + formatMoves(moves)
+    if len(line) > width:
+        line = "Moves: ..." + line[len(line) - width + 10 :]
+    return line[:width]
+
+
+def resultMessage(state: State) -> str:
+    result = gameResult(state)
+    if result == Result.LOST:
+        return "You lost!"
+    elif result == Result.WON:
+        return "You won!"
+    else:
+        return ""
+
+
+def statusLines(state: State) -> List[str]:
+    """
+    Lines printed below the maze
+    """
+    return ["Moves: " + formatMoves(turnMoves(state)), resultMessage(state)]
+
+
+class IncrementalRenderer:
+    """
+    Prints the maze once and after that only the cells that change
+
+    Cells are updated with cursor positioning, so the maze stays at the top of
+    the terminal instead of scrolling.
+    """
+
+    def __init__(self) -> None:
+        # locations of the player and the minotaur on the screen
+        self.actors: List[Coord] = []
+        # lines on the screen below the maze
+        self.lines: List[str] = []
+
+    def __call__(self, state: State) -> None:
+        subState = state.turns[-1]
+        height = len(state.maze)
+        output: List[str] = []
+
+        if len(self.lines) == 0:
+            output.append("\033[H\033[2J")
+            for row in state.layerRows:
+                output.append(row + "\n")
+        actors = [subState.player, subState.minotaur]
+        if actors != self.actors:
+            for (x, y) in self.actors:
+                output.append(f"\033[{y + 1};{x + 1}H{state.layer[y][x]}")
+            (x, y) = subState.player
+            output.append(f"\033[{y + 1};{x + 1}H{PLAYER_TILE}")
+            (x, y) = subState.minotaur
+            output.append(f"\033[{y + 1};{x + 1}H{MINOTAUR_TILE}")
+            self.actors = actors
+
+        # a line wrapping to a second row would push the next one down
+        width = shutil.get_terminal_size().columns
+        lines = [movesLine(turnMoves(state), width), resultMessage(state)[:width]]
+        for (i, line) in enumerate(lines):
+            if i >= len(self.lines) or line != self.lines[i]:
+                output.append(f"\033[{height + i + 1};1H\033[K{line}")
+        self.lines = lines
+        output.append(f"\033[{height + len(lines) + 1};1H")
+
+        sys.stdout.write("".join(output))
+        sys.stdout.flush()
+
+
+class PlainRenderer:
+    """
+    Prints the maze without colors or other escape codes
+    """
 
-    for row in printedMaze:
-        print("".join(row))
+    def __init__(self) -> None:
+        self.rows: List[str] = []
 
-    print("Moves: " + ";".join(x.value for x in subState.moves))
+    def __call__(self, state: State) -> None:
+        if len(self.rows) == 0:
+            self.rows = ["".join(x.value for x in row) for row in state.maze]
 
+        subState = state.turns[-1]
+        rows = list(self.rows)
+        for ((x, y), char) in (
+            (subState.player, PLAYER),
+            (subState.minotaur, MINOTAUR),
+        ):
+            rows[y] = rows[y][:x] + char + rows[y][x + 1 :]
+
+        lines = rows + [line for line in statusLines(state) if line != ""]
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+
+
+def renderNothing(state: State) -> None:
+    pass
+
+
+# renderers by name, a new instance for every game
+RENDERERS: Dict[str, Callable[[], Renderer]] = {
+    "ansi": lambda: printMaze,
+    "incremental": IncrementalRenderer,
+    "viewport": lambda: printViewport,
+    "plain": PlainRenderer,
+    "null": lambda: renderNothing,
+}
+
+
+def turnMoves(state: State) -> List[Move]:
+    """
+    Returns the moves played so far
+
+    Each turn only stores its own move, the history is the stack of turns.
+    """
+    return [turn.move for turn in state.turns if turn.move is not None]
+
+
+def gameResult(state: State) -> Result:
+    """
+    Checks the winning and losing conditions of the current turn
+    """
+    subState = state.turns[-1]
     if subState.player == subState.minotaur:
-        print("You lost!")
+        return Result.LOST
     elif subState.player == state.finish:
-        print("You won!")
-        sys.exit(0)
+        return Result.WON
+    else:
+        return Result.UNFINISHED
 
 
 def isLocValid(maze: Maze, loc: Coord) -> bool:
@@ -215,43 +846,739 @@ def moveMinotaur(maze: Maze, player: Coord, minotaur: Coord) -> Coord:
     return newMinotaur
 
 
-def mainLoop(state: State) -> State:
+def cellId(grid: Grid, coord: Coord) -> Cell:
     """
-    Main game loop
+    Returns the cell id of a coordinate
+    """
+    return (coord[1] - grid.y) // 2 * grid.columns + (coord[0] - grid.x) // 2
 
-    - print initial maze
-    - wait for input
-    - check if move is valid
-    - move player
-    - move minotaur twice
-    - check for winning and losing conditions
 
-    Both state and initial are mutated in place.
+def cellCoord(grid: Grid, cell: Cell) -> Coord:
+    """
+    Returns the coordinate of a cell id
+    """
+    (row, column) = divmod(cell, grid.columns)
+    return (grid.x + column * 2, grid.y + row * 2)
+
+
+def compileGrid(maze: Maze, origin: Coord) -> Grid:
+    """
+    Compiles a maze into cells with open direction masks
+
+    Cells get the parity of the origin coordinate. A direction is open when the
+    tile between the cells is not a wall and the next cell is inside the grid.
+    """
+    (x0, y0) = (origin[0] % 2, origin[1] % 2)
+    columns = (max(len(row) for row in maze) - x0) // 2 + 1
+    rows = (len(maze) - y0) // 2 + 1
+    openings = bytearray(columns * rows)
+
+    for row in range(rows):
+        y = y0 + row * 2
+        for column in range(columns):
+            x = x0 + column * 2
+            mask = 0
+            if row > 0 and isLocValid(maze, (x, y - 1)):
+                mask |= OPENINGS[Move.UP]
+            if row < rows - 1 and isLocValid(maze, (x, y + 1)):
+                mask |= OPENINGS[Move.DOWN]
+            if column > 0 and isLocValid(maze, (x - 1, y)):
+                mask |= OPENINGS[Move.LEFT]
+            if column < columns - 1 and isLocValid(maze, (x + 1, y)):
+                mask |= OPENINGS[Move.RIGHT]
+            openings[row * columns + column] = mask
+
+    return Grid(x0, y0, columns, rows, openings)
+
+
+def cellOffsets(grid: Grid) -> Dict[Move, int]:
+    """
+    Cell id difference of moving one cell in each direction
+    """
+    return {
+        Move.UP: -grid.columns,
+        Move.DOWN: grid.columns,
+        Move.LEFT: -1,
+        Move.RIGHT: 1,
+        Move.SKIP: 0,
+    }
+
+
+def sign(x: int) -> int:
+    return (x > 0) - (x < 0)
+
+
+def directionClass(dx: int, dy: int) -> int:
+    """
+    Index 0..8 of the direction from the minotaur towards the player
+    """
+    return (sign(dx) + 1) * 3 + sign(dy) + 1
+
+
+def buildMinotaurSteps(grid: Grid) -> CellTable:
+    """
+    Precomputes a single minotaur step from every cell
+
+    A step only depends on the direction of the player, so there are nine
+    entries per cell. Same rules as in moveMinotaur: horizontally if possible,
+    otherwise vertically.
+    """
+    offsets = cellOffsets(grid)
+    steps: "array[int]" = array("i")
+    for cell in range(grid.columns * grid.rows):
+        mask = grid.openings[cell]
+        for dx in (-1, 0, 1):
+            horizontal = Move.LEFT if dx < 0 else Move.RIGHT
+            for dy in (-1, 0, 1):
+                vertical = Move.UP if dy < 0 else Move.DOWN
+                if dx != 0 and mask & OPENINGS[horizontal]:
+                    steps.append(cell + offsets[horizontal])
+                elif dy != 0 and mask & OPENINGS[vertical]:
+                    steps.append(cell + offsets[vertical])
+                else:
+                    steps.append(cell)
+
+    return steps
+
+
+def minotaurStep(grid: Grid, steps: CellTable, player: Cell, minotaur: Cell) -> Cell:
+    """
+    Moves the minotaur cell one step towards the player cell
+    """
+    (playerRow, playerColumn) = divmod(player, grid.columns)
+    (minotaurRow, minotaurColumn) = divmod(minotaur, grid.columns)
+    direction = directionClass(playerColumn - minotaurColumn, playerRow - minotaurRow)
+    return steps[minotaur * 9 + direction]
+
+
+def minotaurDoubleStep(
+    grid: Grid, steps: CellTable, player: Cell, minotaur: Cell
+) -> Cell:
+    """
+    Moves the minotaur cell both steps of a turn towards the player cell
+    """
+    minotaur = minotaurStep(grid, steps, player, minotaur)
+    return minotaurStep(grid, steps, player, minotaur)
+
+
+def signRuns(start: int, stop: int, pivot: int) -> List[Tuple[int, int, int]]:
+    """
+    Splits range(start, stop) into runs by the sign of (value - pivot)
+    """
+    runs = [
+        (start, min(stop, pivot), -1),
+        (max(start, pivot), min(stop, pivot + 1), 0),
+        (max(start, pivot + 1), stop, 1),
+    ]
+    return [run for run in runs if run[0] < run[1]]
+
+
+def buildMinotaurTable(grid: Grid, steps: CellTable) -> CellTable:
+    """
+    Precomputes where the minotaur ends up after both of its steps
+
+    The table is indexed by player cell * cells + minotaur cell. For a given
+    minotaur cell and player row both steps are constant over runs of player
+    columns, so whole runs are filled at once.
+    """
+    cells = grid.columns * grid.rows
+    if cells * cells > MINOTAUR_TABLE_LIMIT:
+        return array("i")
+
+    table: "array[int]" = array("i", bytes(4 * cells * cells))
+    for minotaur in range(cells):
+        (minotaurRow, minotaurColumn) = divmod(minotaur, grid.columns)
+        for playerRow in range(grid.rows):
+            row: List[Cell] = []
+            for (start, stop, dx) in signRuns(0, grid.columns, minotaurColumn):
+                dy = playerRow - minotaurRow
+                first = steps[minotaur * 9 + directionClass(dx, dy)]
+                (firstRow, firstColumn) = divmod(first, grid.columns)
+                for (start2, stop2, dx2) in signRuns(start, stop, firstColumn):
+                    dy2 = playerRow - firstRow
+                    second = steps[first * 9 + directionClass(dx2, dy2)]
+                    row.extend([second] * (stop2 - start2))
+
+            offset = playerRow * grid.columns * cells + minotaur
+            table[offset : offset + grid.columns * cells : cells] = array("i", row)
+
+    return table
+
+
+def buildDistances(grid: Grid, finish: Cell) -> CellTable:
+    """
+    Precomputes the player's distance to the finish from every cell
+
+    Breadth-first search backwards from the finish. Openings are symmetric, so
+    following them from the finish walks the player's moves in reverse.
+    """
+    offsets = cellOffsets(grid)
+    distances: "array[int]" = array("i", [-1]) * (grid.columns * grid.rows)
+    distances[finish] = 0
+    queue = deque([finish])
+
+    while len(queue) > 0:
+        cell = queue.popleft()
+        mask = grid.openings[cell]
+        for (move, bit) in OPENINGS.items():
+            newCell = cell + offsets[move]
+            if mask & bit and distances[newCell] < 0:
+                distances[newCell] = distances[cell] + 1
+                queue.append(newCell)
+
+    return distances
+
+
+def cellMoves(grid: Grid) -> List[Tuple[int, int]]:
+    """
+    Returns the direction bit, or 0 if always possible, and the cell offset of
+    each of SOLVER_MOVES
+    """
+    offsets = cellOffsets(grid)
+    return [(OPENINGS.get(move, 0), offsets[move]) for move in SOLVER_MOVES]
+
+
+def moveMinotaurCell(state: State, player: Cell, minotaur: Cell) -> Cell:
+    """
+    Minotaur moves twice towards the player cell
+
+    Uses the minotaur transition table or the single step table for mazes
+    that are too large for it.
+    """
+    if len(state.minotaurTable) > 0:
+        cells = state.grid.columns * state.grid.rows
+        return state.minotaurTable[player * cells + minotaur]
+
+    return minotaurDoubleStep(state.grid, state.minotaurSteps, player, minotaur)
+
+
+class SparseTable(Dict[Position, int]):
+    """
+    Position values for mazes with too many positions for an array, missing
+    ones are 0
+    """
+
+    def __missing__(self, position: Position) -> int:
+        return 0
+
+
+PositionTable = Union[memoryview, SparseTable]
+
+
+def positionTable(positions: int, code: Literal["B", "i"]) -> PositionTable:
+    """
+    Returns zeroed values of an array type code for the given number of
+    positions, or a sparse table above POSITION_TABLE_LIMIT positions
+    """
+    if positions > POSITION_TABLE_LIMIT:
+        return SparseTable()
+    return memoryview(bytearray(positions * struct.calcsize(code))).cast(code)
+
+
+def encodePosition(grid: Grid, player: Coord, minotaur: Coord) -> Position:
+    """
+    Encodes player and minotaur coordinates as a single integer
+    """
+    return cellId(grid, player) * grid.columns * grid.rows + cellId(grid, minotaur)
+
+
+def searchBreadthFirst(state: State) -> Search:
+    """
+    Finds the shortest winning move sequence from the current turn
+
+    Breadth-first search over encoded (player, minotaur) positions, every
+    position is expanded at most once.
     """
-    printMaze(state)
     subState = state.turns[-1]
+    grid = state.grid
+    cells = grid.columns * grid.rows
+    finish = cellId(grid, state.finish)
+    start = encodePosition(grid, subState.player, subState.minotaur)
 
-    if len(state.initial) > 0:
-        move = state.initial.pop(0)
-    elif state.solver:
-        move = Move.AUTO
+    if subState.player == subState.minotaur:
+        return Search(None, SearchStats())
+    if subState.player == state.finish:
+        return Search([], SearchStats())
+
+    table = state.minotaurTable
+    steps = state.minotaurSteps
+    moves = cellMoves(grid)
+
+    # index of the move that led to a position + 1, 0 for unseen positions
+    seen = positionTable(cells * cells, "B")
+    seen[start] = 1
+    parents = positionTable(cells * cells, "i")
+    queue = deque([start])
+    expanded = 0
+    duplicates = 0
+    backtracks = 0
+    frontierPeak = 1
+
+    while len(queue) > 0:
+        frontierPeak = max(frontierPeak, len(queue))
+        position = queue.popleft()
+        expanded += 1
+        queued = len(queue)
+        (player, minotaur) = divmod(position, cells)
+        mask = grid.openings[player]
+
+        for (index, (bit, offset)) in enumerate(moves):
+            if bit and not mask & bit:
+                continue
+
+            newPlayer = player + offset
+            # hot path, the table lookup of moveMinotaurCell without the call
+            if len(table) > 0:
+                newMinotaur = table[newPlayer * cells + minotaur]
+            else:
+                newMinotaur = minotaurDoubleStep(grid, steps, newPlayer, minotaur)
+            if newPlayer == newMinotaur:
+                continue
+
+            newPosition = newPlayer * cells + newMinotaur
+            if seen[newPosition]:
+                duplicates += 1
+                continue
+            seen[newPosition] = index + 1
+            parents[newPosition] = position
+
+            if newPlayer == finish:
+                searchStats = SearchStats(
+                    expanded, duplicates, backtracks, frontierPeak
+                )
+                return Search(pathMoves(seen, parents, start, newPosition), searchStats)
+
+            queue.append(newPosition)
+
+        if len(queue) == queued:
+            backtracks += 1
+
+    return Search(None, SearchStats(expanded, duplicates, backtracks, frontierPeak))
+
+
+def searchAStar(state: State) -> Search:
+    """
+    Finds the shortest winning move sequence from the current turn
+
+    A* search over encoded (player, minotaur) positions. The heuristic is the
+    player's distance to the finish ignoring the minotaur, which never
+    overestimates and changes by at most one per move, so the first time the
+    finish is taken from the heap the path is the shortest.
+    """
+    subState = state.turns[-1]
+    grid = state.grid
+    cells = grid.columns * grid.rows
+    distances = state.distances
+    finish = cellId(grid, state.finish)
+    start = encodePosition(grid, subState.player, subState.minotaur)
+
+    if subState.player == subState.minotaur:
+        return Search(None, SearchStats())
+    if distances[start // cells] < 0:
+        return Search(None, SearchStats())
+
+    table = state.minotaurTable
+    steps = state.minotaurSteps
+    moves = cellMoves(grid)
+
+    # index of the move that led to a position + 1, 0 for unseen positions
+    seen = positionTable(cells * cells, "B")
+    seen[start] = 1
+    closed = positionTable(cells * cells, "B")
+    # moves from the start, 0 for positions not reached yet
+    costs = positionTable(cells * cells, "i")
+    costs[start] = 0
+    parents = positionTable(cells * cells, "i")
+    # (estimated total cost, -cost, position), deeper positions first on ties
+    heap = [(distances[start // cells], 0, start)]
+    expanded = 0
+    duplicates = 0
+    backtracks = 0
+    frontierPeak = 1
+
+    while len(heap) > 0:
+        frontierPeak = max(frontierPeak, len(heap))
+        (_, cost, position) = heapq.heappop(heap)
+        if closed[position]:
+            continue
+        closed[position] = 1
+        expanded += 1
+        queued = len(heap)
+        (player, minotaur) = divmod(position, cells)
+
+        if player == finish:
+            searchStats = SearchStats(expanded, duplicates, backtracks, frontierPeak)
+            return Search(pathMoves(seen, parents, start, position), searchStats)
+
+        mask = grid.openings[player]
+        newCost = 1 - cost
+        for (index, (bit, offset)) in enumerate(moves):
+            if bit and not mask & bit:
+                continue
+
+            newPlayer = player + offset
+            # hot path, the table lookup of moveMinotaurCell without the call
+            if len(table) > 0:
+                newMinotaur = table[newPlayer * cells + minotaur]
+            else:
+                newMinotaur = minotaurDoubleStep(grid, steps, newPlayer, minotaur)
+            if newPlayer == newMinotaur:
+                continue
+
+            newPosition = newPlayer * cells + newMinotaur
+            if closed[newPosition] or 0 < costs[newPosition] <= newCost:
+                duplicates += 1
+                continue
+            seen[newPosition] = index + 1
+            costs[newPosition] = newCost
+            parents[newPosition] = position
+            estimate = newCost + distances[newPlayer]
+            heapq.heappush(heap, (estimate, -newCost, newPosition))
+
+        if len(heap) == queued:
+            backtracks += 1
+
+    return Search(None, SearchStats(expanded, duplicates, backtracks, frontierPeak))
+
+
+def pathMoves(
+    seen: PositionTable,
+    parents: PositionTable,
+    start: Position,
+    end: Position,
+) -> List[Move]:
+    """
+    Follows the parent positions back from the end to build the solution
+    """
+    moves: List[Move] = []
+    while end != start:
+        moves.append(SOLVER_MOVES[seen[end] - 1])
+        end = parents[end]
+    moves.reverse()
+    return moves
+
+
+def buildMinotaurIndex(state: State) -> MinotaurIndex:
+    """
+    Inverts the minotaur transitions
+
+    Counting sort of all (player, minotaur) positions by the position after the
+    minotaur has moved.
+    """
+    cells = state.grid.columns * state.grid.rows
+    positions = cells * cells
+    table = state.minotaurTable
+    if len(table) == 0:
+        table = array(
+            "i",
+            (
+                moveMinotaurCell(state, player, minotaur)
+                for player in range(cells)
+                for minotaur in range(cells)
+            ),
+        )
+
+    starts: "array[int]" = array("i", bytes(4 * (positions + 1)))
+    for player in range(cells):
+        base = player * cells
+        for newMinotaur in table[base : base + cells]:
+            starts[base + newMinotaur + 1] += 1
+    for position in range(positions):
+        starts[position + 1] += starts[position]
+
+    minotaurs: "array[int]" = array("i", bytes(4 * positions))
+    filled = starts[:-1]
+    for player in range(cells):
+        base = player * cells
+        for (minotaur, newMinotaur) in enumerate(table[base : base + cells]):
+            minotaurs[filled[base + newMinotaur]] = minotaur
+            filled[base + newMinotaur] += 1
+
+    return MinotaurIndex(starts, minotaurs)
+
+
+def buildOutcomes(state: State, index: MinotaurIndex) -> CellTable:
+    """
+    Labels every position as won in k moves, lost or draw
+
+    Retrograde analysis: starting from the positions where the player is on
+    the finish (won in 0) or caught (lost), a position is won in k + 1 moves
+    if some move leads to a position won in k moves and lost if every move
+    leads to a lost position. Positions that are neither are draws, which
+    includes positions that can never occur in a game.
+
+    Predecessors come from the player's moves in reverse and the minotaur
+    index. Raises ValueError if the finish is not on a cell of the grid.
+    """
+    grid = state.grid
+    cells = grid.columns * grid.rows
+    positions = cells * cells
+    finish = cellId(grid, state.finish)
+    # an id out of range or aliasing another cell would break the tables below
+    if not 0 <= finish < cells or cellCoord(grid, finish) != state.finish:
+        raise ValueError(f"finish at {state.finish} is not on a cell of the grid")
+    moves = cellMoves(grid)
+    # number of moves from each player cell, skipping is always possible
+    moveCounts = [1 + bin(mask).count("1") for mask in grid.openings]
+
+    outcomes: "array[int]" = array("i", [POSITION_DRAW]) * positions
+    # number of moves from a position known to lose
+    lostMoves = bytearray(positions)
+    queue: Deque[Position] = deque()
+
+    outcomes[finish * cells : (finish + 1) * cells] = array("i", [0]) * cells
+    for player in range(cells):
+        outcomes[player * cells + player] = POSITION_LOST
+    queue.extend(range(finish * cells, (finish + 1) * cells))
+    queue.remove(finish * cells + finish)
+    queue.extend(player * cells + player for player in range(cells))
+
+    while len(queue) > 0:
+        newPosition = queue.popleft()
+        outcome = outcomes[newPosition]
+        (newPlayer, newMinotaur) = divmod(newPosition, cells)
+        start = index.starts[newPosition]
+        stop = index.starts[newPosition + 1]
+
+        for (bit, offset) in moves:
+            player = newPlayer - offset
+            if bit and not (0 <= player < cells and grid.openings[player] & bit):
+                continue
+
+            for minotaur in index.minotaurs[start:stop]:
+                position = player * cells + minotaur
+                if outcomes[position] != POSITION_DRAW:
+                    continue
+                if outcome >= 0:
+                    outcomes[position] = outcome + 1
+                    queue.append(position)
+                else:
+                    lostMoves[position] += 1
+                    if lostMoves[position] == moveCounts[player]:
+                        outcomes[position] = POSITION_LOST
+                        queue.append(position)
+
+    return outcomes
+
+
+def analyseMaze(state: State) -> State:
+    """
+    Returns the state with the outcomes of all positions
+
+    With the outcomes the solver and hints only look up the answer. The tables
+    are added to the cache. Raises ValueError if the maze has more than
+    ANALYSE_LIMIT positions.
+    """
+    if len(state.outcomes) > 0:
+        return state
+
+    cells = state.grid.columns * state.grid.rows
+    if cells * cells > ANALYSE_LIMIT:
+        raise ValueError(
+            f"maze is too large to analyse: {cells * cells} positions, "
+            + f"the limit is {ANALYSE_LIMIT}"
+        )
+
+    start = time.perf_counter()
+    index = state.minotaurIndex
+    if len(index.starts) == 0:
+        index = buildMinotaurIndex(state)
+    state = state._replace(outcomes=buildOutcomes(state, index), minotaurIndex=index)
+    stats.tableTime += time.perf_counter() - start
+    saveTables(state)
+
+    return state
+
+
+def searchOutcomes(state: State) -> Search:
+    """
+    Follows the outcome table from the current turn to the finish
+
+    Every step picks a move to a position that is won in one move less.
+    Nothing is expanded, so the stats are all zero.
+    """
+    subState = state.turns[-1]
+    grid = state.grid
+    cells = grid.columns * grid.rows
+    position = encodePosition(grid, subState.player, subState.minotaur)
+    outcome = state.outcomes[position]
+    if outcome < 0:
+        return Search(None, SearchStats())
+
+    solverMoves = list(zip(SOLVER_MOVES, cellMoves(grid)))
+    moves: List[Move] = []
+    while outcome > 0:
+        (player, minotaur) = divmod(position, cells)
+        mask = grid.openings[player]
+        for (move, (bit, offset)) in solverMoves:
+            if bit and not mask & bit:
+                continue
+            newPlayer = player + offset
+            newMinotaur = moveMinotaurCell(state, newPlayer, minotaur)
+            newPosition = newPlayer * cells + newMinotaur
+            if state.outcomes[newPosition] == outcome - 1:
+                break
+        moves.append(move)
+        position = newPosition
+        outcome -= 1
+
+    return Search(moves, SearchStats())
+
+
+def solutionKey(state: State) -> SolutionKey:
+    subState = state.turns[-1]
+    return (state.digest, subState.player, subState.minotaur)
+
+
+def search(state: State) -> Search:
+    """
+    Searches for the shortest solution from the current turn
+
+    Solutions are looked up from the solution cache first. Analysed mazes are
+    solved from their outcome table.
+    """
+    key = solutionKey(state)
+    cached = solutionCache.get(key)
+    if cached is not None:
+        return cached
+
+    if len(state.outcomes) > 0:
+        result = searchOutcomes(state)
+    elif state.strategy == Strategy.ASTAR:
+        result = searchAStar(state)
     else:
-        try:
-            move = Move(getch())
-        except ValueError:  # invalid move
-            return state
+        result = searchBreadthFirst(state)
 
-    if move == Move.QUIT:
-        print("You quit!")
-        sys.exit(1)
+    solutionCache.put(key, result.moves)
+    stats.add(result.stats)
+    return result
+
+
+def solve(state: State) -> Optional[List[Move]]:
+    """
+    Solves the maze from the current turn without any terminal I/O
+
+    Returns the shortest winning move sequence or None if there is none.
+    """
+    return search(state).moves
+
+
+def solveFile(
+    filename: str, strategy: Strategy, cacheDir: Optional[str]
+) -> SolveResult:
+    """
+    Loads and solves a single maze file
+
+    A maze that cannot be loaded gives a result with the error instead of
+    raising, so that one bad file does not stop a batch.
+    """
+    start = time.perf_counter()
+    tableTime = stats.tableTime
+    try:
+        state = loadMaze(filename, cacheDir)._replace(strategy=strategy)
+    except (OSError, ValueError) as e:
+        elapsed = time.perf_counter() - start
+        return SolveResult(
+            filename, None, None, SearchStats(), 0.0, elapsed, False, str(e)
+        )
+    tableTime = stats.tableTime - tableTime
+    hits = solutionCache.hits
+    result = search(state)
+    elapsed = time.perf_counter() - start
+    cached = solutionCache.hits > hits
+    key = solutionKey(state)
+    return SolveResult(
+        filename, key, result.moves, result.stats, tableTime, elapsed, cached
+    )
+
+
+def mazeFiles(pattern: str) -> List[str]:
+    """
+    Returns the maze files in a directory or matching a glob pattern
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "*.txt")
+    return sorted(glob.glob(pattern))
+
+
+def loadSolutions(filename: Optional[str]) -> None:
+    if filename is not None:
+        solutionCache.load(filename)
+
+
+def solveFiles(
+    filenames: List[str],
+    strategy: Strategy,
+    cacheDir: Optional[str],
+    jobs: Optional[int],
+    solutions: Optional[str] = None,
+) -> Iterator[SolveResult]:
+    """
+    Solves maze files in parallel processes
+
+    Every maze is a task of its own, so each result is yielded as soon as that
+    maze is solved, not in the given order. The worker processes start with the
+    solutions saved in the solutions file and the results are added to the
+    solution cache and the stats of this process.
+    """
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=loadSolutions, initargs=(solutions,)
+    ) as executor:
+        futures = [
+            executor.submit(solveFile, filename, strategy, cacheDir)
+            for filename in filenames
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            if result.key is not None:
+                solutionCache.put(result.key, result.moves)
+            if result.error is None and not result.cached:
+                stats.add(result.stats)
+            stats.tableTime += result.tableTime
+            yield result
+
+
+def solveResultJson(result: SolveResult) -> str:
+    """
+    Formats a solver result as a single line JSON object
+    """
+    moves = None
+    if result.moves is not None:
+        moves = formatMoves(result.moves)
+    return json.dumps(
+        {
+            "filename": result.filename,
+            "solvable": result.moves is not None,
+            "moves": moves,
+            **result.stats._asdict(),
+            "tableTime": result.tableTime,
+            "elapsed": result.elapsed,
+            "cached": result.cached,
+            "error": result.error,
+        }
+    )
+
+
+def applyMove(state: State, move: Move) -> State:
+    """
+    Plays a single move without any I/O
+
+    - resolve auto move from the solver
+    - undo or check if move is valid
+    - move player
+    - move minotaur twice
+
+    Quitting is left to the caller. State is mutated in place.
+    """
+    subState = state.turns[-1]
 
     if move == Move.AUTO:
-        uncheckedMoves = state.traversed[(subState.player, subState.minotaur)]
-        # pick a move at random from unchecked moves or undo
-        if len(uncheckedMoves) == 0:
+        # play the first move of the shortest solution or undo if there is none
+        solution = solve(state)
+        if solution is None or len(solution) == 0:
             move = Move.UNDO
         else:
-            move = random.choice(list(uncheckedMoves))
+            move = solution[0]
 
     if move == Move.UNDO:
         if len(state.turns) > 1:
@@ -262,60 +1589,364 @@ def mainLoop(state: State) -> State:
         # if the game is lost or won, allow only undo and quit
         return state
 
-    # remove this move from the list of unchecked moves
-    if move in state.traversed[(subState.player, subState.minotaur)]:
-        state.traversed[(subState.player, subState.minotaur)].remove(move)
-
     (player, valid) = movePlayer(state.maze, subState.player, move)
     if not valid:
         return state
 
     # minotaur moves twice
-    minotaur = moveMinotaur(state.maze, player, state.turns[-1].minotaur)
+    minotaur = moveMinotaur(state.maze, player, subState.minotaur)
     minotaur = moveMinotaur(state.maze, player, minotaur)
-    moves = subState.moves + [move]
+    state.turns.append(Turn(player=player, minotaur=minotaur, move=move))
+
+    return state
 
-    uncheckedMoves = validMoves(state.maze, player)
-    # if there already is a substate with the same player and minotaur locations,
-    # use that subState's uncheckedMoves
-    if (player, minotaur) in state.traversed:
-        uncheckedMoves = state.traversed[(player, minotaur)]
-    # if game is lost, uncheckedMoves is empty
-    if player == minotaur or player == state.finish:
-        uncheckedMoves = set()
 
-    state.traversed[(player, minotaur)] = uncheckedMoves
+def replay(state: State) -> State:
+    """
+    Plays all scripted initial moves without printing the intermediate mazes
 
-    state.turns.append(Turn(player=player, minotaur=minotaur, moves=moves))
+    Stops before a quit so that the main loop can handle it.
+    """
+    while len(state.initial) > 0 and state.initial[0] != Move.QUIT:
+        state = applyMove(state, state.initial.popleft())
 
     return state
 
 
-def main() -> None:
-    argv = sys.argv[1:]
-    solver = False
-    if len(argv) > 0 and argv[0] == "--solver":
-        solver = True
-        argv.pop(0)
-
-    if len(argv) == 0 or len(argv) > 2:
-        print(
-            "Usage: python3 theseus-and-the-minotaur.py [--solver] "
-            + "<maze filename> <optional starting position>"
-        )
+def verify(state: State, moves: Iterable[Move]) -> Outcome:
+    """
+    Plays recorded moves from the current turn without any I/O
+
+    The given state is not modified. Playing stops at a quit.
+    """
+    game = state._replace(turns=list(state.turns), initial=deque())
+    for move in moves:
+        if move == Move.QUIT:
+            break
+        game = applyMove(game, move)
+
+    return Outcome(gameResult(game), len(game.turns) - 1)
+
+
+def verifyFile(
+    filename: str, cacheDir: Optional[str] = None
+) -> Iterator[Tuple[str, Union[Outcome, str]]]:
+    """
+    Verifies recorded games listed in a file
+
+    Each line has a maze filename, relative to the listing file, and the moves
+    separated by whitespace. No moves or "-" is a game without moves, like the
+    solver prints for mazes without a solution. Every maze is loaded only once.
+    A line that cannot be verified gives "file:line" and the reason instead of
+    an outcome.
+    """
+    states: Dict[str, State] = {}
+    directory = os.path.dirname(filename)
+
+    with open(filename) as f:
+        for (number, line) in enumerate(f, 1):
+            fields = line.split()
+            if len(fields) == 0:
+                continue
+
+            location = f"{filename}:{number}"
+            if len(fields) > 2:
+                yield (location, "expected a maze filename and moves")
+                continue
+
+            mazeFilename = fields[0]
+            moves = fields[1] if len(fields) == 2 else "-"
+            try:
+                if mazeFilename not in states:
+                    path = os.path.join(directory, mazeFilename)
+                    states[mazeFilename] = loadMaze(path, cacheDir)
+                game = deque() if moves == "-" else parseMoves(moves)
+            except (OSError, ValueError) as e:
+                yield (location, str(e))
+                continue
+
+            yield (mazeFilename, verify(states[mazeFilename], game))
+
+
+def mainLoop(state: State) -> State:
+    """
+    Main game loop
+
+    - print initial maze
+    - check for winning condition
+    - wait for input or take the next scripted move
+    - apply the move
+
+    Both state and initial are mutated in place.
+    """
+    state.render(state)
+
+    if gameResult(state) == Result.WON:
+        sys.exit(0)
+
+    if state.solver and len(state.initial) == 0:
+        # solve once and play the solution back as scripted moves
+        solution = solve(state)
+        if solution is None:
+            print("No solution!")
+            sys.exit(1)
+        state.initial.extend(solution)
+        state = state._replace(solver=False)
+
+    if len(state.initial) > 0:
+        move = state.initial.popleft()
+    else:
+        from getch import getch  # type: ignore
+
+        try:
+            move = Move(getch())
+        except ValueError:  # invalid move
+            return state
+
+    if move == Move.QUIT:
+        print("You quit!")
         sys.exit(1)
 
-    filename = argv.pop(0)
-    state = loadMaze(filename)
-    state = state._replace(solver=solver)
+    return applyMove(state, move)
+
+
+def parseMoves(moves: str) -> Deque[Move]:
+    """
+    Parses moves separated by semicolons, e.g. "n;n;e"
+    """
+    return deque(Move(x) for x in moves.split(";"))
+
+
+def formatMoves(moves: Iterable[Move]) -> str:
+    return ";".join(x.value for x in moves)
+
+
+def frameName(function: Tuple[str, int, str]) -> str:
+    (filename, line, name) = function
+    if filename == "~":
+        # built-in functions have no file
+        return name.replace(";", ",")
+    return f"{os.path.basename(filename)}:{line}:{name}".replace(";", ",")
+
+
+def collapsedStacks(profile: pstats.Stats) -> List[str]:
+    """
+    Formats a profile as collapsed stacks, one "a;b;c microseconds" per line
+
+    cProfile only records callers one level up, so the time of a function is
+    divided between its call paths in proportion to the time spent in it from
+    each caller. Recursive calls are cut at the first repeated function.
+    """
+    functions = profile.stats  # type: ignore
+    callees: Dict[Tuple[str, int, str], Dict[Tuple[str, int, str], float]] = {}
+    for (function, (_, _, _, _, callers)) in functions.items():
+        for (caller, (_, _, _, cumulative)) in callers.items():
+            callees.setdefault(caller, {})[function] = cumulative
+
+    lines: List[str] = []
+
+    def walk(function: Tuple[str, int, str], stack: List[str], share: float) -> None:
+        (_, _, own, _, _) = functions[function]
+        stack = stack + [frameName(function)]
+        microseconds = round(own * share * 1e6)
+        if microseconds > 0:
+            lines.append(f"{';'.join(stack)} {microseconds}")
+
+        for (callee, spent) in callees.get(function, {}).items():
+            total = functions[callee][3]
+            if frameName(callee) in stack or total <= 0:
+                continue
+            walk(callee, stack, share * spent / total)
+
+    roots = [function for (function, row) in functions.items() if len(row[4]) == 0]
+    for root in roots:
+        walk(root, [], 1.0)
+
+    return lines
+
+
+def saveProfile(profiler: cProfile.Profile, filename: str) -> None:
+    """
+    Writes the pstats file and the collapsed stacks of a profile
+    """
+    profiler.create_stats()
+    profiler.dump_stats(filename)
+    with open(filename + ".collapsed", "w") as f:
+        for line in collapsedStacks(pstats.Stats(profiler)):
+            f.write(line + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        prog="python3 theseus-and-the-minotaur.py",
+        description="Theseus and the minotaur maze game",
+    )
+    parser.add_argument(
+        "--solver",
+        action="store_true",
+        help="solve the maze and play back the shortest solution, with a "
+        + "directory or a glob pattern solve all the mazes and print the solutions",
+    )
+    parser.add_argument(
+        "--strategy",
+        choices=[x.value for x in Strategy],
+        default=Strategy.BFS.value,
+        help="search algorithm of the solver",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of processes for solving many mazes, defaults to CPU count",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="print the solutions of many mazes as one JSON object per line",
+    )
+    parser.add_argument(
+        "--analyse",
+        action="store_true",
+        help="label every position of the maze when loading it, so that the "
+        + "solver and hints are instant",
+    )
+    parser.add_argument(
+        "--cache",
+        metavar="DIR",
+        help="keep the solver tables of mazes in this directory so that loading "
+        + "the same maze again is fast",
+    )
+    parser.add_argument(
+        "--solutions",
+        metavar="FILE",
+        help="JSON file of solutions that is read before and written after solving",
+    )
+    parser.add_argument(
+        "--stats",
+        metavar="FILE",
+        help="write the solver counters as JSON to FILE when exiting, - for stderr",
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=list(RENDERERS),
+        default="ansi",
+        help="how the maze is printed: ansi (colors), incremental (print once, "
+        + "then update changed cells), viewport (only the part around the player "
+        + "that fits the terminal), plain (no colors) or null (nothing)",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="play the starting moves without printing the intermediate mazes",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="profile the run and write the pstats to FILE and collapsed stacks "
+        + "for flame graphs to FILE.collapsed, batch solving only profiles the "
+        + "main process",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="print the outcome of the starting moves without playing, "
+        + "without starting moves the maze file lists a maze and moves per line",
+    )
+    parser.add_argument("maze", help="maze filename")
+    parser.add_argument(
+        "initial",
+        nargs="?",
+        type=parseMoves,
+        default=deque(),
+        help='optional starting moves, e.g. "n;n;e"',
+    )
+    args = parser.parse_args()
+
+    if args.profile is None:
+        run(args)
+        return
+
+    # the game ends with sys.exit, which passes through the profiler
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(run, args)
+    finally:
+        saveProfile(profiler, args.profile)
+
+
+def loadMazeOrExit(filename: str, cacheDir: Optional[str]) -> State:
+    """
+    Loads a maze given on the command line, exits with the reason if it is
+    invalid
+    """
+    try:
+        return loadMaze(filename, cacheDir)
+    except (OSError, ValueError) as e:
+        sys.exit(f"{filename}: {e}")
+
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Runs the game, the solver or the verifier as given on the command line
+    """
+    strategy = Strategy(args.strategy)
+
+    if args.solutions is not None:
+        solutionCache.load(args.solutions)
+        atexit.register(solutionCache.save, args.solutions)
+    if args.stats is not None:
+        atexit.register(stats.save, args.stats)
+
+    if args.verify:
+        games: Iterable[Tuple[str, Union[Outcome, str]]]
+        if len(args.initial) > 0:
+            state = loadMazeOrExit(args.maze, args.cache)
+            games = [(args.maze, verify(state, args.initial))]
+        else:
+            games = verifyFile(args.maze, args.cache)
+        errors = 0
+        for (mazeFilename, outcome) in games:
+            if isinstance(outcome, Outcome):
+                print(f"{mazeFilename} {outcome.result.value} {outcome.turns}")
+            else:
+                print(f"{mazeFilename}: {outcome}", file=sys.stderr)
+                errors += 1
+        sys.exit(1 if errors > 0 else 0)
+
+    if args.solver and (os.path.isdir(args.maze) or glob.has_magic(args.maze)):
+        errors = 0
+        for result in solveFiles(
+            mazeFiles(args.maze), strategy, args.cache, args.jobs, args.solutions
+        ):
+            if result.error is not None:
+                errors += 1
+            if args.json:
+                print(solveResultJson(result), flush=True)
+            elif result.error is not None:
+                print(f"{result.filename}: {result.error}", file=sys.stderr)
+            elif result.moves is None:
+                print(f"{result.filename} -", flush=True)
+            else:
+                print(f"{result.filename} {formatMoves(result.moves)}", flush=True)
+        sys.exit(1 if errors > 0 else 0)
+
+    state = loadMazeOrExit(args.maze, args.cache)
+    state = state._replace(solver=args.solver, strategy=strategy, initial=args.initial)
+
+    state = state._replace(render=RENDERERS[args.renderer]())
+
+    if args.analyse:
+        try:
+            state = analyseMaze(state)
+        except ValueError as e:
+            sys.exit(str(e))
 
-    initial: List[Move] = []
-    if len(argv) > 0:
-        initial = [Move(x) for x in argv.pop().split(";")]
-        state = state._replace(initial=initial)
+    if args.replay:
+        state = replay(state)
 
     while True:
         state = mainLoop(state)
 
 
-main()
+if __name__ == "__main__":
+    main()